@@ -1,7 +1,7 @@
 '''
 This script scrapes https://books.toscrape.com.
-It creates/updates a JSON file called books.json containing cleaned data
-for all books on the site. 
+It creates/updates a JSON Lines file called books.jsonl containing cleaned data
+for all books on the site, one book per line.
 The output schema is:
 {
     "name": ,
@@ -15,12 +15,15 @@ The application uses asyncio to handle scraping, parsing, and task scheduling.
 '''
 
 import asyncio
+import contextlib
 import time
 from urllib.parse import urljoin
-import json
+import orjson
 from pathlib import Path
 import aiohttp
-from bs4 import BeautifulSoup
+from aiohttp.resolver import AsyncResolver
+from aiohttp_client_cache import CachedSession, SQLiteBackend
+from selectolax.lexbor import LexborHTMLParser
 import grpc
 import book_parser_pb2
 import book_parser_pb2_grpc
@@ -29,19 +32,38 @@ import os
 # Assign main entities
 BASE_URL = "https://books.toscrape.com/"
 BASE_CATALOGUE = urljoin(BASE_URL, "catalogue/page-1.html")
-OUTPUT_FILE = "books.json"
+OUTPUT_FILE = "books.jsonl"
+# The site is static, so re-runs serve listing and product pages from an on-disk HTTP cache
+CACHE_FILE = "scraper_cache.sqlite"
+CACHE_EXPIRE_AFTER = 86400
+
+# Parse product pages in-process unless a remote parser service is configured
+PARSER_ADDR = os.getenv("PARSER_ADDR")
+USE_INPROC = PARSER_ADDR is None
+if USE_INPROC:
+    from parser_service import parse_product_page_fast
+# Number of product pages sent to the parser service per stream
+PARSE_BATCH_SIZE = 50
+# HTML payloads compress well; keep the channel alive across batches
+GRPC_COMPRESSION = grpc.Compression.Gzip
+GRPC_OPTIONS = [
+    ("grpc.max_send_message_length", 32 * 1024 * 1024),
+    ("grpc.max_receive_message_length", 32 * 1024 * 1024),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.http2.min_time_between_pings_ms", 10000),
+]
 
 
 # From the listing page, return titles, book URLs, and the next page URL
 def parse_listing_page_with_next(html: str, current_url: str):
-    soup = BeautifulSoup(html, "html.parser")
+    tree = LexborHTMLParser(html)
 
     books = []
-    for book in soup.find_all("article", class_="product_pod"):
-        name_tag = book.find("h3").find("a")
-        name = name_tag["title"]
+    for name_tag in tree.css("article.product_pod h3 a"):
+        name = name_tag.attributes["title"]
 
-        link = name_tag["href"]
+        link = name_tag.attributes["href"]
         book_url = urljoin(current_url, link)
 
         books.append({
@@ -50,31 +72,101 @@ def parse_listing_page_with_next(html: str, current_url: str):
         })
 
     # Fetch next page's url
-    next_tag = soup.select_one("li.next a")
-    next_url = urljoin(current_url, next_tag["href"]) if next_tag and next_tag.get("href") else None
+    next_tag = tree.css_first("li.next a")
+    next_url = urljoin(current_url, next_tag.attributes["href"]) if next_tag and next_tag.attributes.get("href") else None
 
     return books, next_url
 
 
-# Fetch response text with error checking and concurrncy control
-async def fetch_text(session: aiohttp.ClientSession, url: str, sem: asyncio.Semaphore) -> str:
-    async with sem:
-        async with session.get(url) as resp:
-            resp.raise_for_status()
-            return await resp.text()
+# Concurrency limit for page fetches that can be retuned while requests are waiting.
+# The cap is halved when the site throttles us (at most once per window, so a burst of throttled
+# in-flight requests counts as one event) and grows by one after each clean window of responses.
+class Admission:
+    def __init__(self, cap: int, min_cap: int = 1, max_cap: int | None = None, window: int = 50):
+        self._active = 0
+        self._cap = cap
+        self._min_cap = min_cap
+        self._max_cap = max_cap or cap
+        self._window = window
+        self._clean = 0
+        # Responses finished since the last decrease; starts full so the first throttle takes effect
+        self._since_decrease = window
+        self._cond = asyncio.Condition()
+
+    @property
+    def cap(self) -> int:
+        return self._cap
+
+    async def acquire(self):
+        async with self._cond:
+            await self._cond.wait_for(lambda: self._active < self._cap)
+            self._active += 1
+
+    async def release(self):
+        async with self._cond:
+            self._active -= 1
+            self._cond.notify(1)
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        await self.release()
+
+    async def set_cap(self, n: int):
+        async with self._cond:
+            self._cap = max(self._min_cap, min(n, self._max_cap))
+            self._clean = 0
+            self._cond.notify_all()
+
+    async def throttled(self):
+        # Any throttle restarts the clean window, even one that is too soon to cut the cap again
+        self._clean = 0
+        if self._since_decrease < self._window:
+            self._since_decrease += 1
+            return
+        self._since_decrease = 0
+        await self.set_cap(self._cap // 2)
+
+    async def succeeded(self):
+        self._since_decrease += 1
+        self._clean += 1
+        if self._clean >= self._window and self._cap < self._max_cap:
+            await self.set_cap(self._cap + 1)
+
+
+# Responses that mean the site wants us to slow down
+THROTTLE_STATUSES = {429, 503}
+
+
+# Fetch response text (or the raw body bytes) with error checking and adaptive concurrency control
+async def fetch_text(session: aiohttp.ClientSession, url: str, admission: Admission, raw: bool = False) -> str | bytes:
+    async with admission:
+        try:
+            async with session.get(url) as resp:
+                resp.raise_for_status()
+                body = await resp.read() if raw else await resp.text()
+        except aiohttp.ClientResponseError as exc:
+            if exc.status in THROTTLE_STATUSES:
+                await admission.throttled()
+            raise
+    await admission.succeeded()
+    return body
 
 
 async def fetch_text_with_retry(
     session: aiohttp.ClientSession,
     url: str,
-    sem: asyncio.Semaphore,
+    admission: Admission,
+    raw: bool = False,
     retries: int = 3,
     base_delay: float = 0.5,
-) -> str:
+) -> str | bytes:
     last_exc = None
     for attempt in range(retries):
         try:
-            return await fetch_text(session, url, sem)
+            return await fetch_text(session, url, admission, raw)
         except Exception as exc:
             last_exc = exc
             if attempt < retries - 1:
@@ -82,118 +174,237 @@ async def fetch_text_with_retry(
     raise last_exc
 
 
-# Scrape individual book details
-async def scrape_book_details_async(
-    session: aiohttp.ClientSession,
-    book_url: str,
-    sem: asyncio.Semaphore,
-    stub: book_parser_pb2_grpc.BookParserServiceStub,):
-    html = await fetch_text_with_retry(session, book_url, sem)
+# Parse a product page locally, skipping UPCs already seen in this run (mirrors ALREADY_EXISTS)
+def parse_book_inproc(html: bytes, seen_upcs: set):
     try:
-        resp = await parse_book_with_retry(stub, html)
-        # Convert protobuf Book message to a dict
-        book = resp.book
-        return {
-            "availability": book.availability,
-            "upc": book.upc,
-            "price_excl_tax": book.price_excl_tax,
-            "tax": book.tax,
-            "name": book.name,
-        }  
-    except grpc.aio.AioRpcError as e:
-        code = e.code()
-        # Duplication check
-        if code == grpc.StatusCode.ALREADY_EXISTS:
-            return None
+        book = parse_product_page_fast(html)
+    except ValueError:
+        return None
+    if book["upc"] in seen_upcs:
+        return None
+    seen_upcs.add(book["upc"])
+    return book
+
+
+# Convert a parser response into the output schema (None when the page was rejected)
+def book_from_response(resp: book_parser_pb2.ParseBookResponse):
+    if not resp.HasField("book"):
         return None
+    book = resp.book
+    return {
+        "name": book.name,
+        "availability": book.availability,
+        "upc": book.upc,
+        "price_excl_tax": book.price_excl_tax,
+        "tax": book.tax,
+    }
+
+
+# Yield (position, html) for a batch of fetch tasks in the order they finish, skipping failed fetches
+async def completed_pages(fetches: list[asyncio.Task]):
+    async def _indexed(i, fetch):
+        try:
+            return i, await fetch
+        except Exception as exc:
+            return i, exc
 
+    for next_done in asyncio.as_completed([_indexed(i, fetch) for i, fetch in enumerate(fetches)]):
+        i, html = await next_done
+        if not isinstance(html, Exception):
+            yield i, html
 
-async def parse_book_with_retry(
+
+# Parse product pages with the parser service over a single stream. Pages are taken from `queue`
+# as (position, html) until a None sentinel, and each (position, response) pair is appended to
+# `answered` as it arrives. A retry only re-sends the pages that have no response yet
+# (re-sending a recorded page would come back as a duplicate and the book would be lost).
+async def parse_books_with_retry(
     stub: book_parser_pb2_grpc.BookParserServiceStub,
-    html: str,
+    queue: asyncio.Queue,
+    answered: list,
     retries: int = 3,
     base_delay: float = 0.5,
 ):
+    sent = []
+    exhausted = False
     last_exc = None
     for attempt in range(retries):
+        call = stub.ParseBooks()
+
+        async def _write(resend):
+            nonlocal exhausted
+            for _, html in resend:
+                await call.write(book_parser_pb2.ParseBookRequest(html=html))
+            while not exhausted:
+                page = await queue.get()
+                if page is None:
+                    exhausted = True
+                    break
+                sent.append(page)
+                await call.write(book_parser_pb2.ParseBookRequest(html=page[1]))
+            await call.done_writing()
+
+        writer = asyncio.create_task(_write(sent[len(answered):]))
         try:
-            return await stub.ParseBook(book_parser_pb2.ParseBookRequest(html=html))
+            async for resp in call:
+                if len(answered) < len(sent):
+                    answered.append((sent[len(answered)][0], resp))
+            await writer
+            return
         except grpc.aio.AioRpcError as exc:
             last_exc = exc
+            writer.cancel()
+            await asyncio.gather(writer, return_exceptions=True)
             if attempt < retries - 1:
                 await asyncio.sleep(base_delay * (2 ** attempt))
     raise last_exc
 
-# Fetch and store all book items from the catalog pages
-async def collect_all_books_from_catalog(session: aiohttp.ClientSession,start_url: str,sem: asyncio.Semaphore,max_pages: int = 200):
-    all_books = []
+
+# Parse the pages fetched by a batch of tasks as each fetch finishes, so one slow page doesn't hold
+# back the rest; returns one entry per task, None for failed or rejected pages
+async def parse_book_batch(
+    fetches: list[asyncio.Task],
+    stub: book_parser_pb2_grpc.BookParserServiceStub | None,
+    seen_upcs: set,):
+    results = [None] * len(fetches)
+    if stub is None:
+        async for i, html in completed_pages(fetches):
+            results[i] = parse_book_inproc(html, seen_upcs)
+        return results
+
+    queue = asyncio.Queue()
+
+    async def _feed():
+        try:
+            async for page in completed_pages(fetches):
+                queue.put_nowait(page)
+        finally:
+            queue.put_nowait(None)
+
+    feeder = asyncio.create_task(_feed())
+    answered = []
+    try:
+        await parse_books_with_retry(stub, queue, answered)
+    except grpc.aio.AioRpcError:
+        pass
+    finally:
+        feeder.cancel()
+        await asyncio.gather(feeder, return_exceptions=True)
+    # Pages without a response (failed stream or short reply) stay None
+    for i, resp in answered:
+        results[i] = book_from_response(resp)
+    return results
+
+# Open keep-alive sockets up front so the first wave of page fetches skips DNS and TCP/TLS setup
+async def warm_up_connections(session: aiohttp.ClientSession, url: str, count: int):
+    async def _head():
+        async with session.head(url):
+            pass
+
+    await asyncio.gather(*(_head() for _ in range(count)), return_exceptions=True)
+
+# Yield book items from the catalog pages as each page comes back
+async def iter_listing_books(session: aiohttp.ClientSession,start_url: str,admission: Admission,max_pages: int = 200):
     current_url = start_url
     pages = 0
 
     while current_url and pages < max_pages:
-        html = await fetch_text_with_retry(session, current_url, sem)
+        html = await fetch_text_with_retry(session, current_url, admission)
         books, next_url = parse_listing_page_with_next(html, current_url)
-        all_books.extend(books)
+        for book in books:
+            yield book
         current_url = next_url
         pages += 1
 
-    return all_books
-
-# Load existing items from JSON (or return an empty list)
-def load_existing_items(path: str):
+# Collect the UPCs already stored in the JSON Lines file, one line at a time (malformed lines are skipped)
+def load_existing_upcs(path: str) -> set:
     p = Path(path)
+    upcs = set()
     if not p.exists():
-        return []
-    try:
-        data = json.loads(p.read_text(encoding="utf-8"))
-        return data if isinstance(data, list) else []
-    except Exception:
-        return []
-
-
-# Create or overwrite the JSON file
-def create_json_file(path: str, items: list[dict]):
-    Path(path).write_text(json.dumps(items, indent=2), encoding="utf-8")
-
-# Chunk the tasks
-async def gather_in_batches(coros, batch_size=100):
-    results = []
-    for i in range(0, len(coros), batch_size):
-        batch = coros[i:i+batch_size]
-        batch_results = await asyncio.gather(*batch, return_exceptions=True)
-        results.extend(batch_results)
-    return results
+        return upcs
+    with p.open("rb") as f:
+        for line in f:
+            try:
+                upcs.add(orjson.loads(line)["upc"])
+            except (ValueError, KeyError, TypeError):
+                continue
+    return upcs
+
+
+# Append items whose UPC is not stored yet; returns how many were written
+def append_json_lines(path: str, items: list[dict], existing_upcs: set) -> int:
+    added = 0
+    with Path(path).open("a+b") as f:
+        # Terminate a line cut off by an earlier crash so the first new record isn't glued onto it
+        end = f.seek(0, os.SEEK_END)
+        if end:
+            f.seek(end - 1)
+            if f.read(1) != b"\n":
+                f.write(b"\n")
+        for item in items:
+            if item["upc"] not in existing_upcs:
+                f.write(orjson.dumps(item) + b"\n")
+                existing_upcs.add(item["upc"])
+                added += 1
+    return added
 
 # Main entry point
 async def main():
     start_time = time.perf_counter()
-    sem = asyncio.Semaphore(10)
     timeout = aiohttp.ClientTimeout(total=30)
     headers = {"User-Agent": "Mozilla/5.0 (takehome scraper)"}
-
-    async with aiohttp.ClientSession(timeout=timeout, headers=headers) as session:
-        PARSER_ADDR = os.getenv("PARSER_ADDR", "127.0.0.1:50051")
-        async with grpc.aio.insecure_channel(PARSER_ADDR) as channel:
-            stub = book_parser_pb2_grpc.BookParserServiceStub(channel)
-            # 1) Fetch listing page (homepage)
-            books_from_listing = await collect_all_books_from_catalog(session, BASE_CATALOGUE, sem)
+    # Connection pool limits double as the fetch concurrency limit and keep sockets alive between pages.
+    # DNS goes through c-ares (aiodns) instead of getaddrinfo in a thread pool.
+    connector = aiohttp.TCPConnector(
+        resolver=AsyncResolver(),
+        limit=20,
+        limit_per_host=10,
+        ttl_dns_cache=600,
+        keepalive_timeout=30,
+    )
+
+    # Only GETs are cached so the warm-up HEAD requests always open real sockets
+    cache = SQLiteBackend(cache_name=CACHE_FILE, expire_after=CACHE_EXPIRE_AFTER, allowed_methods=("GET",))
+
+    async with CachedSession(cache=cache, connector=connector, timeout=timeout, headers=headers) as session:
+        await warm_up_connections(session, BASE_URL, connector.limit_per_host)
+        seen_upcs = set()
+        channel_ctx = contextlib.nullcontext() if USE_INPROC else grpc.aio.insecure_channel(
+            PARSER_ADDR, options=GRPC_OPTIONS, compression=GRPC_COMPRESSION
+        )
+        async with channel_ctx as channel:
+            stub = book_parser_pb2_grpc.BookParserServiceStub(channel) if channel is not None else None
+            # 1) Walk the listing pages and 2) start each product page fetch as soon as its URL is known,
+            # parsing the fetched pages in batches of PARSE_BATCH_SIZE
+            # All pages come from one host, so the per-host pool size is the real concurrency ceiling
+            admission = Admission(connector.limit_per_host)
+            books_from_listing = []
+            fetches = []
+            batches = []
+            pending = []
+            try:
+                async for book in iter_listing_books(session, BASE_CATALOGUE, admission):
+                    books_from_listing.append(book)
+                    fetch = asyncio.create_task(fetch_text_with_retry(session, book["book_url"], admission, raw=True))
+                    fetches.append(fetch)
+                    pending.append(fetch)
+                    if len(pending) == PARSE_BATCH_SIZE:
+                        batches.append(asyncio.create_task(parse_book_batch(pending, stub, seen_upcs)))
+                        pending = []
+                if pending:
+                    batches.append(asyncio.create_task(parse_book_batch(pending, stub, seen_upcs)))
+            except BaseException:
+                for task in fetches + batches:
+                    task.cancel()
+                raise
             print("Listing books found:", len(books_from_listing))
 
-            # 2) Fetch ALL product pages concurrently
-            coros = [scrape_book_details_async(session, b["book_url"], sem, stub) for b in books_from_listing]
-            details_list = await gather_in_batches(coros, batch_size=100)
-            # 3) Combine into final schema
-            final_items = []
-            for book, details in zip(books_from_listing, details_list):
-                if details is None or isinstance(details, Exception):
-                    continue
-                final_items.append({
-                    "name": details["name"],
-                    "availability": details["availability"],
-                    "upc": details["upc"],
-                    "price_excl_tax": details["price_excl_tax"],
-                    "tax": details["tax"],
-                })
+            details_list = []
+            for batch in await asyncio.gather(*batches, return_exceptions=True):
+                if not isinstance(batch, Exception):
+                    details_list.extend(batch)
+            # 3) Parsed details already follow the final schema; drop skipped pages
+            final_items = [details for details in details_list if isinstance(details, dict)]
 
         if final_items:
             print(final_items[0])
@@ -201,21 +412,12 @@ async def main():
         elapsed = time.perf_counter() - start_time
         print(f"Elapsed time: {elapsed:.2f} seconds")
 
-        existing = load_existing_items(OUTPUT_FILE)
         # Check duplicity
-        existing_upcs = {item.get("upc") for item in existing if isinstance(item, dict)}
-
-        new_items = []
-        for item in final_items:
-            if item["upc"] not in existing_upcs:
-                new_items.append(item)
-                existing_upcs.add(item["upc"])
-
-        combined = existing + new_items
-        create_json_file(OUTPUT_FILE, combined)
+        existing_upcs = load_existing_upcs(OUTPUT_FILE)
+        added = append_json_lines(OUTPUT_FILE, final_items, existing_upcs)
 
-        print(f"New items added: {len(new_items)}")
-        print(f"Total stored items: {len(combined)}")
+        print(f"New items added: {added}")
+        print(f"Total stored items: {len(existing_upcs)}")
 
 
 if __name__ == "__main__":
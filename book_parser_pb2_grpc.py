@@ -40,6 +40,11 @@ class BookParserServiceStub(object):
                 request_serializer=book__parser__pb2.ParseBookRequest.SerializeToString,
                 response_deserializer=book__parser__pb2.ParseBookResponse.FromString,
                 _registered_method=True)
+        self.ParseBooks = channel.stream_stream(
+                '/bookparser.BookParserService/ParseBooks',
+                request_serializer=book__parser__pb2.ParseBookRequest.SerializeToString,
+                response_deserializer=book__parser__pb2.ParseBookResponse.FromString,
+                _registered_method=True)
 
 
 class BookParserServiceServicer(object):
@@ -52,6 +57,13 @@ class BookParserServiceServicer(object):
         context.set_details('Method not implemented!')
         raise NotImplementedError('Method not implemented!')
 
+    def ParseBooks(self, request_iterator, context):
+        """Parse many pages over one stream; responses arrive in request order
+        """
+        context.set_code(grpc.StatusCode.UNIMPLEMENTED)
+        context.set_details('Method not implemented!')
+        raise NotImplementedError('Method not implemented!')
+
 
 def add_BookParserServiceServicer_to_server(servicer, server):
     rpc_method_handlers = {
@@ -60,6 +72,11 @@ def add_BookParserServiceServicer_to_server(servicer, server):
                     request_deserializer=book__parser__pb2.ParseBookRequest.FromString,
                     response_serializer=book__parser__pb2.ParseBookResponse.SerializeToString,
             ),
+            'ParseBooks': grpc.stream_stream_rpc_method_handler(
+                    servicer.ParseBooks,
+                    request_deserializer=book__parser__pb2.ParseBookRequest.FromString,
+                    response_serializer=book__parser__pb2.ParseBookResponse.SerializeToString,
+            ),
     }
     generic_handler = grpc.method_handlers_generic_handler(
             'bookparser.BookParserService', rpc_method_handlers)
@@ -98,3 +115,30 @@ class BookParserService(object):
             timeout,
             metadata,
             _registered_method=True)
+
+    @staticmethod
+    def ParseBooks(request_iterator,
+            target,
+            options=(),
+            channel_credentials=None,
+            call_credentials=None,
+            insecure=False,
+            compression=None,
+            wait_for_ready=None,
+            timeout=None,
+            metadata=None):
+        return grpc.experimental.stream_stream(
+            request_iterator,
+            target,
+            '/bookparser.BookParserService/ParseBooks',
+            book__parser__pb2.ParseBookRequest.SerializeToString,
+            book__parser__pb2.ParseBookResponse.FromString,
+            options,
+            channel_credentials,
+            insecure,
+            call_credentials,
+            compression,
+            wait_for_ready,
+            timeout,
+            metadata,
+            _registered_method=True)
@@ -1,44 +1,88 @@
 import asyncio
 from concurrent import futures
+from functools import lru_cache
+from html import unescape
 import grpc
-from bs4 import BeautifulSoup
+from selectolax.lexbor import LexborHTMLParser
 import book_parser_pb2
 import book_parser_pb2_grpc
-import json
+import orjson
 import os
+import re
+import signal
 from pathlib import Path
 
 
 PARSED_STORAGE = Path(__file__).resolve().parent / "parsed_books.json"
+# Append-only log of books parsed since the last compaction into PARSED_STORAGE
+PARSED_WAL = PARSED_STORAGE.with_suffix(".jsonl")
+COMPACT_INTERVAL = 30
+# Seconds in-flight RPCs get to finish after SIGTERM (docker stop / pod shutdown)
+SHUTDOWN_GRACE = 5
+# Match the scraper's channel settings (compression, message size, keepalive)
+GRPC_COMPRESSION = grpc.Compression.Gzip
+GRPC_OPTIONS = [
+    ("grpc.max_send_message_length", 32 * 1024 * 1024),
+    ("grpc.max_receive_message_length", 32 * 1024 * 1024),
+    ("grpc.http2.max_pings_without_data", 0),
+    ("grpc.keepalive_time_ms", 30000),
+    ("grpc.http2.min_time_between_pings_ms", 10000),
+    # Accept the scraper's 30s keepalive pings (the default minimum is 5 minutes)
+    ("grpc.http2.min_ping_interval_without_data_ms", 10000),
+]
 
+# Fast path for the fixed books.toscrape product template, matched on the raw page bytes
+_RE_NAME = re.compile(rb'<div class="col-sm-6 product_main">\s*<h1>([^<]+)</h1>')
+_RE_UPC = re.compile(rb'<th>UPC</th>\s*<td>([^<]+)</td>')
+_RE_PRICE = re.compile(rb'<th>Price \(excl\. tax\)</th>\s*<td>(?:\xc2\xa3)?([0-9.]+)</td>')
+_RE_TAX = re.compile(rb'<th>Tax</th>\s*<td>(?:\xc2\xa3)?([0-9.]+)</td>')
+_RE_AVAIL = re.compile(rb'<p class="instock availability">\s*<i[^>]*></i>\s*([^<]+)<')
+
+# Repeated strings (availability texts, table headers) share one object across parses
+_intern = {}
+
+def _maybe_intern(s: str) -> str:
+    return _intern.setdefault(s, s) if len(_intern) < 10000 else s
+
+# Many books share the same price and tax strings
+@lru_cache(maxsize=1024)
 def parse_money(text: str) -> float:
-    # Books.toscrape uses £
-    return float(text.replace("£", "").strip())
+    # Books.toscrape uses £; skip the currency prefix by slicing from the first digit
+    i = 0
+    n = len(text)
+    while i < n and not ("0" <= text[i] <= "9"):
+        i += 1
+    return float(text[i:])
 
 
-def parse_product_page(html: str) -> dict:
+def parse_product_page(html: str | bytes) -> dict:
     # Parse required fields from a product page HTML
-    soup = BeautifulSoup(html, "html.parser")
+    tree = LexborHTMLParser(html)
 
     # Name
-    name_tag = soup.select_one("div.product_main h1")
-    name = name_tag.get_text(strip=True) if name_tag else ""
+    name_tag = tree.css_first("div.product_main h1")
+    name = name_tag.text(strip=True) if name_tag else ""
 
     # Availability (e.g. In stock (22 available))
-    availability_tag = soup.find("p", class_="instock availability")
-    availability = " ".join(availability_tag.get_text().split()) if availability_tag else ""
+    availability_tag = tree.css_first("p.instock.availability")
+    availability = _maybe_intern(" ".join(availability_tag.text().split())) if availability_tag else ""
 
     # Product information table
-    table = soup.find("table", class_="table table-striped")
+    table = tree.css_first("table.table-striped")
     if not table:
         raise ValueError("Product information table not found")
 
     info = {}
-    for row in table.find_all("tr"):
-        th = row.find("th")
-        td = row.find("td")
+    for row in table.css("tr"):
+        # Walk the cells directly; a css_first per cell recompiles a selector each time
+        th = td = None
+        for cell in row.iter():
+            if cell.tag == "th":
+                th = cell
+            elif cell.tag == "td":
+                td = cell
         if th and td:
-            info[th.get_text(strip=True)] = td.get_text(strip=True)
+            info[_maybe_intern(th.text(strip=True))] = td.text(strip=True)
 
     #UPC, price.exl, tax
     upc = info.get("UPC", "")
@@ -61,63 +105,194 @@ def parse_product_page(html: str) -> dict:
         "tax": parse_money(tax),
     }
 
+def match_product_page(html: bytes) -> dict | None:
+    # Extract the fields with regexes; returns None when the page doesn't match the template
+    name = _RE_NAME.search(html)
+    upc = _RE_UPC.search(html)
+    price_excl = _RE_PRICE.search(html)
+    tax = _RE_TAX.search(html)
+    availability = _RE_AVAIL.search(html)
+    if not (name and upc and price_excl and tax and availability):
+        return None
+
+    name = unescape(name.group(1).decode("utf-8")).strip()
+    upc = upc.group(1).decode("utf-8").strip()
+    availability = " ".join(availability.group(1).decode("utf-8").split())
+    if not (name and upc and availability):
+        return None
+
+    return {
+        "name": name,
+        "availability": _maybe_intern(availability),
+        "upc": upc,
+        "price_excl_tax": float(price_excl.group(1)),
+        "tax": float(tax.group(1)),
+    }
+
+def parse_product_page_fast(html: bytes) -> dict:
+    # Regex fast path first; any page that doesn't match the template goes through the full parser
+    parsed = match_product_page(html)
+    return parsed if parsed is not None else parse_product_page(html)
+
+def book_message(parsed: dict) -> book_parser_pb2.Book:
+    return book_parser_pb2.Book(
+        name=parsed["name"],
+        availability=parsed["availability"],
+        upc=parsed["upc"],
+        price_excl_tax=parsed["price_excl_tax"],
+        tax=parsed["tax"],
+    )
+
 def load_existing_books():
     p = Path(PARSED_STORAGE)
     if not p.exists():
         return []
     try:
-        data = json.loads(p.read_text(encoding="utf-8"))
+        data = orjson.loads(p.read_bytes())
         return data if isinstance(data, list) else []
     except Exception:
         return []
 
+# Replay books appended to the log since the last compaction (a torn last line is skipped)
+def load_wal_books():
+    p = Path(PARSED_WAL)
+    if not p.exists():
+        return []
+    books = []
+    with p.open("rb") as f:
+        for line in f:
+            try:
+                books.append(orjson.loads(line))
+            except ValueError:
+                continue
+    return books
+
+# Write atomically so a crash mid-write never leaves a truncated file behind
 def save_books(data):
-    Path(PARSED_STORAGE).write_text(json.dumps(data, indent=2), encoding="utf-8")
+    p = Path(PARSED_STORAGE)
+    tmp = p.with_suffix(".tmp")
+    tmp.write_bytes(orjson.dumps(data, option=orjson.OPT_INDENT_2))
+    tmp.replace(p)
 
 class BookParserService(book_parser_pb2_grpc.BookParserServiceServicer):
     def __init__(self):
-        self.lock = asyncio.Lock()
-        self.seen_upcs = set()
+        # Loaded once at startup; also serves as the duplicate check
+        self._books_by_upc = {}
+        for book in load_existing_books() + load_wal_books():
+            if isinstance(book, dict) and book.get("upc"):
+                self._books_by_upc.setdefault(book["upc"], book)
+        self._wal = open(PARSED_WAL, "a+b", buffering=0)
+        end = self._wal.seek(0, os.SEEK_END)
+        if end:
+            # Terminate a line cut off by a crash so the next record isn't glued onto it
+            self._wal.seek(end - 1)
+            if self._wal.read(1) != b"\n":
+                self._wal.write(b"\n")
+        self._dirty = bool(end)
+        # Pages that miss the regex fast path are parsed here; Lexbor releases the GIL while parsing
+        self._pool = futures.ThreadPoolExecutor(max_workers=os.cpu_count())
+
+    def compact(self):
+        # Fold the log into the canonical JSON file, then start a fresh log
+        if not self._dirty:
+            return
+        save_books(list(self._books_by_upc.values()))
+        self._wal.seek(0)
+        self._wal.truncate()
+        self._dirty = False
+
+    async def compact_periodically(self, interval: float = COMPACT_INTERVAL):
+        while True:
+            await asyncio.sleep(interval)
+            self.compact()
+
+    def close(self):
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        self.compact()
+        self._wal.close()
+
+    async def _parse(self, html: bytes) -> dict:
+        # The regex fast path holds the GIL and is quick, so it runs inline; only the Lexbor fallback
+        # is worth handing to the thread pool
+        parsed = match_product_page(html)
+        if parsed is not None:
+            return parsed
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._pool, parse_product_page, html)
+
+    # Record a new book in memory and in the log; returns False for an already stored UPC.
+    # No lock needed: this runs on the event loop with no await between the check and the insert.
+    def _record(self, parsed: dict) -> bool:
+        if parsed["upc"] in self._books_by_upc:
+            return False
+        self._books_by_upc[parsed["upc"]] = parsed
+        self._wal.write(orjson.dumps(parsed) + b"\n")
+        self._dirty = True
+        return True
 
     async def ParseBook(self, request, context):
         try:
-            parsed = parse_product_page(request.html)
+            parsed = await self._parse(request.html)
 
             # Duplicate check
-            async with self.lock:
-                if parsed["upc"] in self.seen_upcs:
-                    await context.abort(grpc.StatusCode.ALREADY_EXISTS, "Duplicate UPC")
-                self.seen_upcs.add(parsed["upc"])
-            
-            book_msg = book_parser_pb2.Book(
-                name=parsed["name"],
-                availability=parsed["availability"],
-                upc=parsed["upc"],
-                price_excl_tax=parsed["price_excl_tax"],
-                tax=parsed["tax"],
-            )
-            existing = load_existing_books()
-            if not any(b.get("upc") == parsed["upc"] for b in existing):
-                existing.append(parsed)
-                save_books(existing)
-
-            return book_parser_pb2.ParseBookResponse(book=book_msg)
+            if not self._record(parsed):
+                await context.abort(grpc.StatusCode.ALREADY_EXISTS, "Duplicate UPC")
+
+            return book_parser_pb2.ParseBookResponse(book=book_message(parsed))
 
         except Exception as e:
             # Return a proper error
             await context.abort(grpc.StatusCode.INVALID_ARGUMENT, str(e))
 
+    async def ParseBooks(self, request_iterator, context):
+        # One response per request, in order; rejected pages carry an error instead of a book
+        async for request in request_iterator:
+            try:
+                parsed = await self._parse(request.html)
+            except Exception as e:
+                yield book_parser_pb2.ParseBookResponse(error=str(e))
+                continue
+
+            if not self._record(parsed):
+                yield book_parser_pb2.ParseBookResponse(error="Duplicate UPC")
+                continue
+
+            yield book_parser_pb2.ParseBookResponse(book=book_message(parsed))
 
 async def serve(host=None, port=None):
     host = host or os.getenv("GRPC_HOST", "0.0.0.0")
     port = port or int(os.getenv("GRPC_PORT", "50051"))
-    server = grpc.aio.server()
-    book_parser_pb2_grpc.add_BookParserServiceServicer_to_server(BookParserService(), server)
+    server = grpc.aio.server(options=GRPC_OPTIONS, compression=GRPC_COMPRESSION)
+    service = BookParserService()
+    book_parser_pb2_grpc.add_BookParserServiceServicer_to_server(service, server)
     server.add_insecure_port(f"{host}:{port}")
 
     await server.start()
+    compactor = asyncio.create_task(service.compact_periodically())
+
+    # Stop the server on SIGTERM so the final compaction below runs under docker and Kubernetes too
+    loop = asyncio.get_running_loop()
+    stop_tasks = set()
+
+    def _on_sigterm():
+        stop_tasks.add(asyncio.create_task(server.stop(SHUTDOWN_GRACE)))
+
+    try:
+        loop.add_signal_handler(signal.SIGTERM, _on_sigterm)
+    except NotImplementedError:
+        # Windows event loops don't support signal handlers
+        pass
+
     print(f"Parser service listening on {host}:{port}")
-    await server.wait_for_termination()
+    try:
+        await server.wait_for_termination()
+    finally:
+        try:
+            loop.remove_signal_handler(signal.SIGTERM)
+        except NotImplementedError:
+            pass
+        compactor.cancel()
+        service.close()
 
 
 if __name__ == "__main__":
@@ -5,28 +5,59 @@ import grpc
 import book_parser_pb2
 import book_parser_pb2_grpc
 
+# Channel and stub are created once and reused across calls
+_channel = None
+_stub = None
+_lock = asyncio.Lock()
 
-async def fetch_html(url: str) -> str:
+
+async def get_stub() -> book_parser_pb2_grpc.BookParserServiceStub:
+    global _channel, _stub
+    async with _lock:
+        if _stub is None:
+            _channel = grpc.aio.insecure_channel(
+                "127.0.0.1:50051",
+                options=[("grpc.keepalive_time_ms", 30000)],
+            )
+            _stub = book_parser_pb2_grpc.BookParserServiceStub(_channel)
+    return _stub
+
+
+async def close_channel():
+    global _channel, _stub
+    if _channel is not None:
+        await _channel.close()
+        _channel = None
+        _stub = None
+
+
+async def fetch_html(url: str) -> bytes:
     async with aiohttp.ClientSession() as session:
         async with session.get(url) as resp:
             resp.raise_for_status()
-            return await resp.text()
+            return await resp.read()
 
 
 async def main():
     url = "https://books.toscrape.com/catalogue/a-light-in-the-attic_1000/index.html"
     html = await fetch_html(url)
 
-    async with grpc.aio.insecure_channel("127.0.0.1:50051") as channel:
-        stub = book_parser_pb2_grpc.BookParserServiceStub(channel)
-        try:
-            resp = await stub.ParseBook(book_parser_pb2.ParseBookRequest(html=html))
-            print(resp.book)
-        except grpc.aio.AioRpcError as e:
-            if e.code() == grpc.StatusCode.ALREADY_EXISTS:
-                print("Duplicate UPC (already parsed)")
-            else:
-                raise
+    stub = await get_stub()
+    try:
+        resp = await stub.ParseBook(book_parser_pb2.ParseBookRequest(html=html))
+        print(resp.book)
+    except grpc.aio.AioRpcError as e:
+        if e.code() == grpc.StatusCode.ALREADY_EXISTS:
+            print("Duplicate UPC (already parsed)")
+        else:
+            raise
+
+
+async def run():
+    try:
+        await main()
+    finally:
+        await close_channel()
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    asyncio.run(run())
\ No newline at end of file